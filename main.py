@@ -1,8 +1,10 @@
 import argparse
 import logging.config
-from src.api import update_ynab
-from src.paths import get_log_config_filepath
+import os
+from src.api import update_ynab_accounts
+from src.paths import get_log_config_filepath, get_logs_path
 
+os.makedirs(get_logs_path(), exist_ok=True)
 logging.config.fileConfig(get_log_config_filepath(), disable_existing_loggers=False)
 logger = logging.getLogger(__name__)
 
@@ -10,20 +12,30 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Revolut to YNAB bridge. Run the program to download the "
         "transactions from the N26 account and upload the into the YNAB budget "
-        "account. Example: python main.py -a my_account_name"
+        "account. Example: python main.py -a my_account_name my_other_account_name"
     )
 
     parser.add_argument(
         "-a",
         action="store",
-        dest="account",
+        dest="accounts",
+        nargs="+",
         required=True,
-        help="Name of the account to update. Has to be defined in config/revolut.toml",
+        help="Names of the accounts to update. Have to be defined in "
+        "config/revolut.toml",
+    )
+
+    parser.add_argument(
+        "--full-sync",
+        action="store_true",
+        dest="full_sync",
+        help="Download the whole transactions history and push all of it to YNAB, "
+        "ignoring the previous syncs",
     )
 
     results = parser.parse_args()
 
     # Run the update process
-    logger.info(f"Requested 💰 YNAB update for account name: {results.account}")
-    update_ynab(results.account)
+    logger.info(f"Requested 💰 YNAB update for account names: {results.accounts}")
+    update_ynab_accounts(results.accounts, full_sync=results.full_sync)
     logger.info(f"YNAB update performed successfully! 🎉🎊🥳")
@@ -1,99 +1,365 @@
+import atexit
+import csv
+import hashlib
+import json
 import logging
 import os
+import threading
+import time
 import ynab_client
 
 from revolut import Revolut
 import pandas as pd
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
-from src.config import get_ynab_account_config, get_revolut_account_config
+from src.config import (
+    get_ynab_account_config,
+    get_revolut_account_config,
+    load_revolut_config,
+)
+from src.paths import (
+    get_logs_path,
+    get_last_sync_filepath,
+    get_uploaded_ids_filepath,
+)
 from src.exceptions import (
     BudgetNotFoundError,
     AccountNotFoundError,
+    UpdateFailedError,
 )
 
+try:
+    import orjson
+except ImportError:  # Optional speed-up, the stdlib json module is used otherwise
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# The transactions are pushed to YNAB in chunks of this size, several at a time
+YNAB_BULK_CHUNK_SIZE = 500
+YNAB_BULK_MAX_WORKERS = 4
+# YNAB rejects import ids longer than this
+YNAB_IMPORT_ID_MAX_LENGTH = 36
+# Days before the last sync from which the Revolut transactions are downloaded again.
+# Some transactions only show up in the API a few days after their date (e.g. card
+# payments settled late), and they would be missed otherwise.
+REVOLUT_SYNC_OVERLAP_DAYS = 30
+# Seconds during which the YNAB budget and account ids are reused without asking the
+# API again. They barely ever change.
+YNAB_IDS_CACHE_TTL = 3600
+
+# Fields of the Revolut transactions used by the bridge. Tuples are much lighter than
+# the dicts given by the Revolut API, which matters for long transaction histories.
+RevolutTransaction = namedtuple(
+    "RevolutTransaction",
+    [
+        "id",
+        "currency",
+        "state",
+        "amount",
+        "fee",
+        "created_date",
+        "description",
+        "merchant",
+    ],
+)
+
+# Clients already configured, indexed by account alias. Reusing them keeps the HTTP
+# connections alive between requests instead of opening a new one for each call.
+_YNAB_CLIENTS = {}
+_REVOLUT_CLIENTS = {}
+# Budget and account ids already retrieved, indexed by YNAB account alias and budget
+# name. Each value is a tuple with the retrieval time and the ids. The locks, with the
+# same keys, make concurrent updates sharing a key wait for a single request.
+_YNAB_IDS_CACHE = {}
+_YNAB_IDS_CACHE_LOCKS = {}
+
+
+def _use_orjson_for_ynab_requests():
+    """Make the YNAB client serialize the request bodies with orjson, which is much
+    faster than the stdlib json module for big bulk uploads. Only the json module seen
+    by ynab_client.rest is replaced, the global one is left untouched.
+    """
+    # The body is returned as UTF-8 bytes, which urllib3 sends unchanged. A non-ASCII
+    # str would be encoded as Latin-1 by http.client (orjson does not escape it to
+    # ASCII like the stdlib json), failing or sending invalid JSON for e.g. "10€".
+    ynab_client.rest.json = SimpleNamespace(
+        dumps=lambda obj, **kwargs: orjson.dumps(obj),
+        loads=json.loads,
+    )
+
 
-def update_ynab(revolut_account_alias):
+if orjson is not None:
+    _use_orjson_for_ynab_requests()
+
+
+def update_ynab_accounts(revolut_account_aliases, max_workers=None, full_sync=False):
+    """Update several Revolut accounts concurrently. The process is I/O-bound (all the
+    time is spent waiting for the Revolut and YNAB APIs), so each account is synced in
+    its own thread.
+
+    Args:
+        revolut_account_aliases (list): names of the Revolut accounts as configured in
+        the config/revolut.toml file.
+        max_workers (int): maximum number of accounts to be updated at the same time. By
+        default, all of them.
+        full_sync (bool): see update_ynab.
+
+    Raises:
+        UpdateFailedError: this exception is raised when any of the accounts could not
+        be updated, once all the updates have finished. The error of each account is
+        logged separately.
+    """
+    revolut_account_aliases = list(revolut_account_aliases)
+    max_workers = max_workers or len(revolut_account_aliases)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(update_ynab, alias, full_sync=full_sync)
+            for alias in revolut_account_aliases
+        ]
+    failed_aliases = []
+    for alias, future in zip(revolut_account_aliases, futures):
+        try:
+            future.result()
+        except Exception:
+            logger.exception(f"Update of the account '{alias}' failed")
+            failed_aliases.append(alias)
+    if failed_aliases:
+        failed_str = "'" + "', '".join(failed_aliases) + "'"
+        raise UpdateFailedError(f"Update failed for the accounts: {failed_str}")
+
+
+def update_ynab(revolut_account_alias, full_sync=False):
     """Call the Revolut API with account name specified, download all the transactions,
     and bulk push them to YNAB through their API.
 
     Args:
         revolut_account_alias (str): Name of the Revolut account as configured in the
         config/Revolut.toml file.
+        full_sync (bool): whether to ignore the previous syncs, downloading the whole
+        transactions history and pushing all of it to YNAB.
     """
     revolut_conf = get_revolut_account_config(revolut_account_alias)
     ynab_account_alias = revolut_conf["ynab_account_alias"]
     ynab_current_account_name = revolut_conf["ynab_current_account_name"]
     ynab_conf = get_ynab_account_config(ynab_account_alias)
     budget_name = ynab_conf["budget_name"]
-    transactions = download_revolut_transactions(revolut_account_alias)
 
-    # Save the transactions for traceback purposes
-    filename = datetime.now().isoformat() + "_" + revolut_account_alias + ".csv"
-    path = os.path.join("logs", filename)
-    pd.DataFrame(transactions).to_csv(path, sep=",", index=False)
-
-    transactions = filter_revolut_transactions(transactions, config=revolut_conf)
-    upload_revolut_transactions_to_ynab(
-        transactions_revolut=transactions,
-        budget_name=budget_name,
-        ynab_current_account_name=ynab_current_account_name,
-        ynab_account_alias=ynab_account_alias
+    # Only download the transactions that may have changed since the last sync. Older
+    # ones would be discarded by the filters anyway.
+    sync_date = datetime.now()
+    from_date = get_oldest_importable_date()
+    last_sync_date = None if full_sync else load_last_sync_date(revolut_account_alias)
+    if last_sync_date is not None:
+        last_sync_date -= timedelta(days=REVOLUT_SYNC_OVERLAP_DAYS)
+        from_date = max(from_date, last_sync_date)
+    transactions = download_revolut_transactions(
+        revolut_account_alias, from_date=from_date
     )
 
+    # Save the transactions for traceback purposes. The file is written in the
+    # background while the transactions are filtered and pushed to YNAB.
+    filename = datetime.now().isoformat() + "_" + revolut_account_alias + ".csv"
+    path = os.path.join(get_logs_path(), filename)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        dump = executor.submit(dump_revolut_transactions, transactions, path)
+
+        transactions = parse_revolut_transactions(transactions)
+        transactions = filter_revolut_transactions(transactions, config=revolut_conf)
+
+        # Skip the transactions already pushed to YNAB in previous syncs
+        uploaded_ids = load_uploaded_transaction_ids(revolut_account_alias)
+        if not full_sync:
+            transactions = [t for t in transactions if t.id not in uploaded_ids]
+            logger.info(
+                f"{len(transactions)} transactions remaining after removing the ones "
+                "already uploaded!"
+            )
+
+        if transactions:
+            upload_revolut_transactions_to_ynab(
+                transactions_revolut=transactions,
+                budget_name=budget_name,
+                ynab_current_account_name=ynab_current_account_name,
+                ynab_account_alias=ynab_account_alias
+            )
+            # Store only the new ids, a full sync pushes the known ones again
+            save_uploaded_transaction_ids(
+                revolut_account_alias,
+                [t.id for t in transactions if t.id not in uploaded_ids],
+            )
+        else:
+            logger.info("No new transactions to push to YNAB")
+        dump.result()
+    save_last_sync_date(revolut_account_alias, sync_date)
+
+
+def load_uploaded_transaction_ids(revolut_account_alias):
+    """Read the ids of the transactions of a Revolut account already pushed to YNAB
 
-def filter_revolut_transactions(transactions, config):
+    Args:
+        revolut_account_alias (str): Name of the Revolut account as configured in the
+        config/Revolut.toml file.
+
+    Returns:
+        set: ids of the Revolut transactions already uploaded
+    """
+    path = get_uploaded_ids_filepath(revolut_account_alias)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(f.read().split())
+
+
+def save_uploaded_transaction_ids(revolut_account_alias, transaction_ids):
+    """Append the ids of the transactions of a Revolut account pushed to YNAB to the
+    ones already stored, one id per line.
+
+    Args:
+        revolut_account_alias (str): Name of the Revolut account as configured in the
+        config/Revolut.toml file.
+        transaction_ids (list): ids of the Revolut transactions uploaded
+    """
+    path = get_uploaded_ids_filepath(revolut_account_alias)
+    with open(path, "a") as f:
+        f.writelines(f"{transaction_id}\n" for transaction_id in transaction_ids)
+
+
+def load_last_sync_date(revolut_account_alias):
+    """Read the date of the last successful sync of a Revolut account
+
+    Args:
+        revolut_account_alias (str): Name of the Revolut account as configured in the
+        config/Revolut.toml file.
+
+    Returns:
+        datetime: date of the last sync, None if the account has never been synced.
     """
-    This function is intended to be applied to the raw list of transactions provided by
-    the revolut API.
+    path = get_last_sync_filepath(revolut_account_alias)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        last_sync = json.load(f)
+    return datetime.fromtimestamp(last_sync["timestamp"])
+
+
+def save_last_sync_date(revolut_account_alias, sync_date):
+    """Store the date of the last successful sync of a Revolut account
+
+    Args:
+        revolut_account_alias (str): Name of the Revolut account as configured in the
+        config/Revolut.toml file.
+        sync_date (datetime): date of the sync
+    """
+    path = get_last_sync_filepath(revolut_account_alias)
+    with open(path, "w") as f:
+        json.dump({"timestamp": sync_date.timestamp()}, f)
+
+
+def get_oldest_importable_date():
+    """YNAB restriction, cannot handle transactions with more than 5 years old.
+
+    Returns:
+        datetime: date of the oldest transaction that can be imported into YNAB
+    """
+    return datetime.now() - timedelta(days=365 * 5 - 30)  # Now - (5 years - 1 month)
+
+
+def dump_revolut_transactions(transactions, path):
+    """Save the raw list of transactions provided by the revolut API to a csv file.
 
     Args:
         transactions (list): list of dictionaries, one dict per transaction, as given by
         the revolut API.
+        path (str): path of the csv file to be written.
+    """
+    # Not all the transactions have the same keys, use all of them keeping their order
+    fieldnames = list(dict.fromkeys(key for t in transactions for key in t))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(transactions)
+
+
+def parse_revolut_transactions(transactions):
+    """Keep only the fields used by the bridge from the raw list of transactions
+    provided by the revolut API.
+
+    Args:
+        transactions (list): list of dictionaries, one dict per transaction, as given by
+        the revolut API.
+
+    Returns:
+        list: transactions as RevolutTransaction tuples, in the same order.
+    """
+    # Not all the transactions have the same keys (e.g. the declined ones may lack the
+    # fee), only the ones needed by the filters are required here
+    return [
+        RevolutTransaction(
+            id=t["id"],
+            currency=t["currency"],
+            state=t["state"],
+            amount=t.get("amount"),
+            fee=t.get("fee"),
+            created_date=t["createdDate"],
+            description=t.get("description"),
+            merchant=t.get("merchant"),
+        )
+        for t in transactions
+    ]
+
+
+def filter_revolut_transactions(transactions, config):
+    """
+    This function is intended to be applied to the list of transactions provided by
+    the revolut API, once parsed.
+
+    Args:
+        transactions (list): list of RevolutTransaction, as given by
+        parse_revolut_transactions.
 
     Returns:
         list: same format as the input transactions list but potentially shortened.
     """
-    # Remove transactions in different currency
     logger.info(f"Received {len(transactions)} transactions to filter")
+    # Remove transactions in different currency and the temporary transactions. The
+    # temporary ones will disappear and be replaced by permanent ones. If not removed,
+    # this causes duplicates in YNAB, because they have different import IDs.
     currency = config["currency"]
-    transactions = list(filter(lambda x: x["currency"] in currency, transactions))
+    # The currency can be configured either as a single code or as a list of codes
+    currency = frozenset([currency] if isinstance(currency, str) else currency)
+    filtered_types = frozenset(("DECLINED", "FAILED", "REVERTED"))
+
+    # Filter transactions from more then 5 years ago. The threshold is expressed as a
+    # timestamp in milliseconds, like the transaction dates, so that they can be
+    # compared directly.
+    threshold = get_oldest_importable_date().timestamp() * 1000
+
+    transactions = [
+        t
+        for t in transactions
+        if t.currency in currency
+        and t.state not in filtered_types
+        and t.created_date > threshold
+    ]
     logger.info(
-        f"{len(transactions)} transactions remaining after applying the "
-        "currency filter!"
+        f"{len(transactions)} transactions remaining after applying the filters!"
     )
-
-    # Remove the temporary transactions. These transactions will disappear and be
-    # replaced by permanent ones. If not removed, this causes duplicates in YNAB,
-    # because they have different import IDs.
-    filtered_types = ["DECLINED", "FAILED", "REVERTED"]
-    transactions = list(
-        filter(lambda x: x["state"] not in filtered_types, transactions)
-    )
-    logger.info(
-        f"{len(transactions)} transactions remaining after applying the filter!"
-    )
-
-    # Filter transactions from more then 5 years ago. YNAB restriction, cannot handle
-    # transactions with more than 5 years old.
-    threshold = datetime.now() - timedelta(days = 365*5-30)  # Now - (5 years - 1 month)
-
-    transactions = filter(
-        lambda t: datetime.fromtimestamp(t["createdDate"] / 1000) > threshold,
-        transactions
-    )
-    return list(transactions)
+    return transactions
 
 
-def download_revolut_transactions(account_alias):
+def download_revolut_transactions(account_alias, from_date=None):
     """Download all the Revolut transactions from the specified account
 
     Args:
         account_alias (str): Name of the Revolut account as configured in the
         config/revolut.toml file
+        from_date (datetime): only the transactions since this date are downloaded.
+        By default, all of them.
 
     Raises:
         AuthenticationTimeoutError: if the user doesn't give acces through the mobile
@@ -108,7 +374,7 @@ def download_revolut_transactions(account_alias):
     client = get_revolut_client(account_alias)
     # Get Revolut transactions
     logger.info("Requesting transfers to the Revolut API...")
-    transactions = client.get_account_transactions().raw_list
+    transactions = client.get_account_transactions(from_date=from_date).raw_list
     logger.info(f"{len(transactions)} transactions have been retrieved!")
     return transactions
 
@@ -120,7 +386,7 @@ def upload_revolut_transactions_to_ynab(
     and account. It uses the bulk method for uploading the transactions to YNAB
 
     Args:
-        transactions_revolut (list): list of dictionaries, Revolut native format
+        transactions_revolut (list): list of RevolutTransaction
         budget_name (str): name of the budget as configured in the config/ynab.toml
         ynab_current_account_name (str): name of the current account existing in YNAB
         corresponding to a Revolut account as configured in the config/Revolut.toml
@@ -139,120 +405,252 @@ def upload_revolut_transactions_to_ynab(
     # Get an instance of YNAB and Revolut APIs
     ynab_cli = get_ynab_client(ynab_account_alias)
 
-    # Find the existing budgets and its respective IDs in YNAB
-    ynab_budget_id_map = get_ynab_budget_id_mapping(ynab_cli)
-    # If the budget name is not among the budget names retrieved, raise an exception
-    if budget_name not in ynab_budget_id_map:
-        budgets = list(ynab_budget_id_map.keys())
-        budgets_str = "'" + "', '".join(budgets) + "'"
-        raise BudgetNotFoundError(
-            f"Budget named '{budget_name}' not found, available ones: {budgets_str}"
+    # Find the budget ID and the existing accounts and its respective IDs within it
+    lookup_time = time.monotonic()
+    budget_id, ynab_account_id_map = get_cached_ynab_budget_and_account_maps(
+        ynab_account_alias, budget_name
+    )
+    if ynab_current_account_name not in ynab_account_id_map:
+        # The ids may be outdated (e.g. the account has been renamed), refresh them
+        # unless they have just been retrieved
+        budget_id, ynab_account_id_map = get_cached_ynab_budget_and_account_maps(
+            ynab_account_alias, budget_name, min_retrieval_time=lookup_time
         )
-    # Get the budget ID
-    budget_id = ynab_budget_id_map[budget_name]
     logger.info(f"YNAB budget with name '{budget_name}' paired with id '{budget_id}'")
 
-    # Find the existing accounts and its respective IDs in YNAB, within the budget
-    ynab_account_id_map = get_ynab_account_id_mapping(ynab_cli, budget_id)
-    # If the account name is not among the account names retrieved, raise an exception
-
-    if ynab_current_account_name not in ynab_account_id_map:
-        accounts = list(ynab_account_id_map.keys())
-        accounts_str = "'" + "', '".join(accounts) + "'"
+    # Get the account ID. If the account name is not among the account names
+    # retrieved, raise an exception
+    try:
+        account_id = ynab_account_id_map[ynab_current_account_name]
+    except KeyError:
+        accounts_str = "'" + "', '".join(ynab_account_id_map) + "'"
         raise AccountNotFoundError(
             f"YNAB account named '{ynab_current_account_name}' not found, available ones: {accounts_str}"
-        )
-    # Get the account ID
-    account_id = ynab_account_id_map[ynab_current_account_name]
+        ) from None
     logger.info(f"Account with name '{ynab_current_account_name}' paired with id '{account_id}'")
     logger.info(f"Translating transactions to YNAB format...")
-    transactions_ynab = list(
-        map(
-            lambda t: _convert_revolut_transaction_to_ynab(t, account_id),
-            transactions_revolut,
-        )
+    transactions_ynab = _convert_revolut_transactions_to_ynab(
+        transactions_revolut, account_id
     )
     logger.info(f"Requesting transactions push to the YNAB api...")
-    transactions_ynab = ynab_cli.BulkTransactions(transactions=transactions_ynab)
-    ynab_cli.TransactionsApi().bulk_create_transactions(budget_id, transactions_ynab)
+    transactions_api = ynab_client.TransactionsApi(ynab_cli)
+
+    def push(chunk):
+        chunk = ynab_client.BulkTransactions(transactions=chunk)
+        transactions_api.bulk_create_transactions(budget_id, chunk)
+
+    with ThreadPoolExecutor(max_workers=YNAB_BULK_MAX_WORKERS) as executor:
+        # Consume the iterator so that the exceptions are raised
+        list(executor.map(push, _chunks(transactions_ynab, YNAB_BULK_CHUNK_SIZE)))
     logger.info(f"Transactions pushed to YNAB successfully!")
 
 
-def _convert_revolut_transaction_to_ynab(t_revolut, account_id):
-    """Converts from the Revolut format to the YNAB format. Can be enhanced so that it
+def _convert_revolut_transactions_to_ynab(transactions_revolut, account_id):
+    """Converts a batch of transactions from the Revolut format to the YNAB format. The
+    fields are computed column-wise over the whole batch. Can be enhanced so that it
     translates from the Revolut automatic categorization to the YNAB one.
 
     Args:
-        t_revolut (dict): dictionary containing all the rRvolut native transaction keys
+        transactions_revolut (list): list of RevolutTransaction
         account_id (str): id of the YNAB account
 
     Returns:
-        ynab_client.Transaction: transaction in the YNAB native format.
+        list: transactions (ynab_client.Transaction) in the YNAB native format.
     """
-    t_ynab = {
-        "id": t_revolut["id"],
-        "import_id": t_revolut["id"],
-        "memo": t_revolut["description"],
-        "account_id": account_id,
-        "date": datetime.fromtimestamp(t_revolut["createdDate"] / 1000),
-        "amount": int(t_revolut["amount"] - t_revolut["fee"]) * 10,
-        "cleared": "uncleared",
-        "approved": False,
-        "deleted": False,
-        "payee_name": t_revolut.get("merchant", {}).get("name", None),
-    }
-    t_ynab = ynab_client.TransactionWrapper(t_ynab)
-    return t_ynab.transaction
-
-
-def get_ynab_budget_id_mapping(ynab_client):
-    """Build a mapping of YNAB budget names to internal ids
+    if not transactions_revolut:
+        return []
+    df = pd.DataFrame(transactions_revolut)
+    # Convert the columns to lists of python objects, the YNAB client does not know
+    # how to serialize numpy types
+    ids = df["id"].tolist()
+    import_ids = [_get_ynab_import_id(id_) for id_ in ids]
+    memos = df["description"].tolist()
+    # Dates are taken in UTC, so that they do not depend on the machine timezone
+    dates = pd.to_datetime(df["created_date"], unit="ms", utc=True).dt.date.tolist()
+    # Revolut amounts are in cents and YNAB ones in milliunits. Round after scaling,
+    # truncating before would silently drop any fraction of a cent.
+    amounts = (df["amount"] - df["fee"]).mul(10).round().astype("int64").tolist()
+    payee_names = [
+        m.get("name") if isinstance(m, dict) else None for m in df["merchant"].tolist()
+    ]
+
+    transactions_ynab = []
+    for id_, import_id, memo, date, amount, payee_name in zip(
+        ids, import_ids, memos, dates, amounts, payee_names
+    ):
+        t_ynab = {
+            "id": id_,
+            "import_id": import_id,
+            "memo": memo,
+            "account_id": account_id,
+            "date": date,
+            "amount": amount,
+            "cleared": "uncleared",
+            "approved": False,
+            "deleted": False,
+            "payee_name": payee_name,
+        }
+        transactions_ynab.append(ynab_client.TransactionWrapper(t_ynab).transaction)
+    return transactions_ynab
+
+
+def _get_ynab_import_id(revolut_id):
+    """Build the YNAB import id of a Revolut transaction. The Revolut id is used as is
+    when YNAB accepts it, so that the transactions already imported keep being
+    deduplicated. Longer ids are replaced by a stable hash that fits in the limit.
 
     Args:
-        ynab_client (ynab_client): YNAB configured client with the credentials
+        revolut_id (str): id of the Revolut transaction
 
     Returns:
-        dict: Dictionary with budget names as keys and ids as values
+        str: import id, at most YNAB_IMPORT_ID_MAX_LENGTH characters long
+    """
+    if len(revolut_id) <= YNAB_IMPORT_ID_MAX_LENGTH:
+        return revolut_id
+    return hashlib.blake2b(revolut_id.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _chunks(sequence, size):
+    """Split a sequence in consecutive chunks of, at most, the given size
+
+    Args:
+        sequence (list): sequence to split
+        size (int): maximum size of each chunk
+
+    Yields:
+        list: chunks of the original sequence, in order
     """
-    response = ynab_client.BudgetsApi().get_budgets().data.budgets
-    mapping = {budget.name: budget.id for budget in response}
-    return mapping
+    for i in range(0, len(sequence), size):
+        yield sequence[i : i + size]
 
 
-def get_ynab_account_id_mapping(ynab_client, budget_id):
-    """Build a mapping of YNAB account names to internal ids
+def get_cached_ynab_budget_and_account_maps(
+    ynab_account_alias, budget_name, min_retrieval_time=None
+):
+    """Same as get_ynab_budget_and_account_maps, but the result is kept in memory
+    during YNAB_IDS_CACHE_TTL seconds to avoid requesting it on every update.
 
     Args:
-        ynab_client (ynab_client): YNAB configured client with the credentials
-        budget_id (str): id of the budget to query
+        ynab_account_alias (str): alias of the YNAB account configured into
+        config/ynab.toml
+        budget_name (str): name of the budget as configured in the config/ynab.toml
+        min_retrieval_time (float): time.monotonic() value before which the cached
+        ids are considered outdated and requested again. By default, only the TTL is
+        taken into account.
+
+    Raises:
+        BudgetNotFoundError: this exception is raised when the budget specified does
+        not exist in the YNAB account configured
 
     Returns:
-        dict: Dictionary with account names as keys and ids as values
+        tuple: id of the budget and dictionary with account names as keys and ids as
+        values
     """
-    response = ynab_client.AccountsApi().get_accounts(budget_id).data.accounts
-    mapping = {account.name: account.id for account in response}
-    return mapping
+    key = (ynab_account_alias, budget_name)
+    with _YNAB_IDS_CACHE_LOCKS.setdefault(key, threading.Lock()):
+        cached = _YNAB_IDS_CACHE.get(key)
+        if (
+            cached is None
+            or time.monotonic() - cached[0] > YNAB_IDS_CACHE_TTL
+            or (min_retrieval_time is not None and cached[0] < min_retrieval_time)
+        ):
+            retrieval_time = time.monotonic()
+            ynab_cli = get_ynab_client(ynab_account_alias)
+            ids = get_ynab_budget_and_account_maps(ynab_cli, budget_name)
+            cached = (retrieval_time, ids)
+            _YNAB_IDS_CACHE[key] = cached
+    return cached[1]
+
+
+def get_ynab_budget_and_account_maps(ynab_cli, budget_name):
+    """Find the id of a YNAB budget and build a mapping of its account names to
+    internal ids. The budgets are requested together with their accounts, so that a
+    single call to the API is needed. The ynab_client models do not support the
+    include_accounts parameter, so the endpoint is called directly and the raw JSON
+    response is used.
+
+    Args:
+        ynab_cli (ynab_client.ApiClient): YNAB configured client with the credentials
+        budget_name (str): name of the budget as configured in the config/ynab.toml
+
+    Raises:
+        BudgetNotFoundError: this exception is raised when the budget specified does
+        not exist in the YNAB account configured
+
+    Returns:
+        tuple: id of the budget and dictionary with account names as keys and ids as
+        values
+    """
+    response = ynab_cli.call_api(
+        "/budgets",
+        "GET",
+        query_params=[("include_accounts", "true")],
+        header_params={"Accept": "application/json"},
+        response_type="object",
+        auth_settings=["bearer"],
+        _return_http_data_only=True,
+    )
+    ynab_budget_map = {budget["name"]: budget for budget in response["data"]["budgets"]}
+    # If the budget name is not among the budget names retrieved, raise an exception
+    try:
+        budget = ynab_budget_map[budget_name]
+    except KeyError:
+        budgets_str = "'" + "', '".join(ynab_budget_map) + "'"
+        raise BudgetNotFoundError(
+            f"Budget named '{budget_name}' not found, available ones: {budgets_str}"
+        ) from None
+    mapping = {account["name"]: account["id"] for account in budget["accounts"]}
+    return budget["id"], mapping
 
 
 def get_ynab_client(account_alias):
-    """Handles YNAB connection and returns the cli
+    """Handles YNAB connection and returns the cli. The client is created once per
+    account alias and reused afterwards, so that the connection pool is shared by all
+    the requests.
 
     Args:
-        account_alias (str): Name of the Revolut account as configured in the
-        config/revolut.toml file
+        account_alias (str): Name of the YNAB account as configured in the
+        config/ynab.toml file
 
     Returns:
-        ynab_client: client ready to query the API
+        ynab_client.ApiClient: client ready to query the API
+    """
+    if account_alias not in _YNAB_CLIENTS:
+        config = get_ynab_account_config(account_alias)
+        configuration = ynab_client.Configuration()
+        # Use dedicated dicts, the default ones are shared by all the configurations
+        configuration.api_key_prefix = {"Authorization": "Bearer"}
+        configuration.api_key = {"Authorization": config["api_key"]}
+        # All the Revolut accounts pushing to this YNAB account may be uploading at the
+        # same time, each one through YNAB_BULK_MAX_WORKERS connections. Size the pool
+        # for that, never going below the client default.
+        n_accounts = sum(
+            revolut_conf.get("ynab_account_alias") == account_alias
+            for revolut_conf in load_revolut_config().values()
+        )
+        configuration.connection_pool_maxsize = max(
+            configuration.connection_pool_maxsize,
+            YNAB_BULK_MAX_WORKERS * max(n_accounts, 1),
+        )
+        _YNAB_CLIENTS[account_alias] = ynab_client.ApiClient(configuration)
+    return _YNAB_CLIENTS[account_alias]
+
+
+@atexit.register
+def _close_ynab_clients():
+    """Close the thread pools of the cached YNAB clients while the interpreter is still
+    alive. Otherwise, the clients are destroyed during the interpreter teardown and
+    their __del__ fails, printing an error at the end of every run.
     """
-    config = get_ynab_account_config(account_alias)
-    configuration = ynab_client.Configuration()
-    configuration.api_key_prefix["Authorization"] = "Bearer"
-    configuration.api_key["Authorization"] = config["api_key"]
-    return ynab_client
+    while _YNAB_CLIENTS:
+        _, client = _YNAB_CLIENTS.popitem()
+        client.pool.close()
+        client.pool.join()
 
 
 def get_revolut_client(revolut_account_alias):
-    """Handles the Revolut connection and returns the cli
+    """Handles the Revolut connection and returns the cli. The client is created once
+    per account alias and reused afterwards, so that its HTTP session is kept alive.
 
     Args:
         revolut_account_alias (str): name of the YNAB account associated to a Revolut account
@@ -261,6 +659,8 @@ def get_revolut_client(revolut_account_alias):
     Returns:
         revolut.Revolut: client ready to query the API
     """
-    config = get_revolut_account_config(revolut_account_alias)
-    client = Revolut(device_id=config["device_id"], token=config["token"])
-    return client
+    if revolut_account_alias not in _REVOLUT_CLIENTS:
+        config = get_revolut_account_config(revolut_account_alias)
+        client = Revolut(device_id=config["device_id"], token=config["token"])
+        _REVOLUT_CLIENTS[revolut_account_alias] = client
+    return _REVOLUT_CLIENTS[revolut_account_alias]
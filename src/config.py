@@ -1,16 +1,29 @@
-import toml
+from functools import lru_cache
 from src.paths import get_revolut_config_filepath, get_ynab_config_filepath
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
 
+
+def _load_toml(path):
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    return config
+
+
+@lru_cache(maxsize=1)
 def load_ynab_config():
     path = get_ynab_config_filepath()
-    config = toml.load(path)
+    config = _load_toml(path)
     return config
 
 
+@lru_cache(maxsize=1)
 def load_revolut_config():
     path = get_revolut_config_filepath()
-    config = toml.load(path)
+    config = _load_toml(path)
     return config
 
 
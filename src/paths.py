@@ -5,6 +5,21 @@ def get_log_config_filepath():
     return "logging.ini"
 
 
+def get_logs_path():
+    path = os.path.join("logs")
+    return path
+
+
+def get_last_sync_filepath(account_alias):
+    path = os.path.join(get_logs_path(), f"{account_alias}_last_sync.json")
+    return path
+
+
+def get_uploaded_ids_filepath(account_alias):
+    path = os.path.join(get_logs_path(), f"{account_alias}.ids")
+    return path
+
+
 def get_config_path():
     path = os.path.join("config")
     return path
@@ -14,7 +29,7 @@ def get_revolut_config_filepath():
     path = os.path.join("config", f"revolut.toml")
     if not os.path.exists(path):
         raise ValueError(
-            f"Account {account_name} not configured. File {path} not found!"
+            f"Revolut accounts not configured. File {path} not found!"
         )
     return path
 
@@ -23,6 +38,6 @@ def get_ynab_config_filepath():
     path = os.path.join("config", f"ynab.toml")
     if not os.path.exists(path):
         raise ValueError(
-            f"Account {account_name} not configured. File {path} not found!"
+            f"YNAB accounts not configured. File {path} not found!"
         )
     return path